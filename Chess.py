@@ -9,7 +9,11 @@ This module implements a complete chess game with all standard rules including:
 - Check and checkmate detection
 - Stalemate detection
 
-The board is represented as a 2D list of characters where:
+The board is represented as a set of 64-bit bitboards (see Position), one
+per piece type and color, plus occupancy masks. Square (row, col) maps to
+bit row*8 + col, so a8 is bit 0 and h1 is bit 63.
+
+Pieces are still described by single characters at the API boundary:
 - Uppercase letters represent white pieces (K,Q,R,B,N,P)
 - Lowercase letters represent black pieces (k,q,r,b,n,p)
 - Dots (.) represent empty squares
@@ -23,7 +27,10 @@ Usage:
     Enter 'quit' to end the game
 """
 
+import random
+import re
 import sys
+from dataclasses import dataclass, field, replace
 
 ########################################
 # Precompute piece moves (truth tables)
@@ -36,27 +43,27 @@ def in_bounds(r, c):
 def build_knight_moves():
     """
     Precompute all possible knight moves for each square.
-    Returns a dict mapping (row,col) -> list of valid destination (row,col) tuples.
+    Returns a tuple indexed by square (r*8+c) of destination square tuples.
     """
     offsets = [
         (-2, -1), (-2, 1), (-1, -2), (-1, 2),
         (1, -2), (1, 2), (2, -1), (2, 1)
     ]
-    moves = {}
+    moves = []
     for r in range(8):
         for c in range(8):
             possible = []
             for dr, dc in offsets:
                 rr, cc = r + dr, c + dc
                 if in_bounds(rr, cc):
-                    possible.append((rr, cc))
-            moves[(r, c)] = possible
-    return moves
+                    possible.append(rr * 8 + cc)
+            moves.append(tuple(possible))
+    return tuple(moves)
 
 def build_king_moves():
     """
     Precompute all possible king moves for each square.
-    Returns a dict mapping (row,col) -> list of valid destination (row,col) tuples.
+    Returns a tuple indexed by square (r*8+c) of destination square tuples.
     Does not include castling which is handled separately.
     """
     offsets = [
@@ -64,28 +71,29 @@ def build_king_moves():
         (0, -1),           (0, 1),
         (1, -1),  (1, 0),  (1, 1)
     ]
-    moves = {}
+    moves = []
     for r in range(8):
         for c in range(8):
             possible = []
             for dr, dc in offsets:
                 rr, cc = r + dr, c + dc
                 if in_bounds(rr, cc):
-                    possible.append((rr, cc))
-            moves[(r, c)] = possible
-    return moves
+                    possible.append(rr * 8 + cc)
+            moves.append(tuple(possible))
+    return tuple(moves)
 
 def build_sliding_moves():
     """
     Precompute all possible sliding piece moves (rooks and bishops).
     For each square, stores the list of squares that can be reached along each direction.
-    Returns (rook_slides, bishop_slides) where each is a dict mapping
-    (row,col) -> list of rays, where each ray is a list of (row,col) tuples.
+    Returns (rook_slides, bishop_slides) where each is a tuple indexed by
+    square (r*8+c) of rays, and each ray is a tuple of squares ordered
+    outwards from the slider.
     """
     rook_dirs = [(1,0), (-1,0), (0,1), (0,-1)]  # Vertical and horizontal
     bishop_dirs = [(1,1), (1,-1), (-1,1), (-1,-1)]  # Diagonals
-    rook_slides = {}
-    bishop_slides = {}
+    rook_slides = []
+    bishop_slides = []
     
     for r in range(8):
         for c in range(8):
@@ -95,11 +103,11 @@ def build_sliding_moves():
                 ray = []
                 rr, cc = r + dr, c + dc
                 while in_bounds(rr, cc):
-                    ray.append((rr, cc))
+                    ray.append(rr * 8 + cc)
                     rr += dr
                     cc += dc
-                rays_r.append(ray)
-            rook_slides[(r,c)] = rays_r
+                rays_r.append(tuple(ray))
+            rook_slides.append(tuple(rays_r))
 
             # Bishop rays
             rays_b = []
@@ -107,13 +115,13 @@ def build_sliding_moves():
                 ray = []
                 rr, cc = r + dr, c + dc
                 while in_bounds(rr, cc):
-                    ray.append((rr, cc))
+                    ray.append(rr * 8 + cc)
                     rr += dr
                     cc += dc
-                rays_b.append(ray)
-            bishop_slides[(r,c)] = rays_b
+                rays_b.append(tuple(ray))
+            bishop_slides.append(tuple(rays_b))
 
-    return rook_slides, bishop_slides
+    return tuple(rook_slides), tuple(bishop_slides)
 
 # Precomputed move tables - computed once at module load time
 KNIGHT_MOVES = build_knight_moves()
@@ -121,46 +129,425 @@ KING_MOVES   = build_king_moves()
 ROOK_SLIDES, BISHOP_SLIDES = build_sliding_moves()
 
 ########################################
-# Board setup + utilities
+# Magic bitboards for sliding pieces
 ########################################
 
-STARTING_BOARD = [
-    list("rnbqkbnr"),  # Black pieces
-    list("pppppppp"),  # Black pawns
-    list("........"),  # Empty squares
-    list("........"),
-    list("........"),
-    list("........"),
-    list("PPPPPPPP"),  # White pawns
-    list("RNBQKBNR"),  # White pieces
+# Fancy magic bitboards: for each square, the attack set of a rook or
+# bishop is looked up as TABLE[sq][((occ & MASK[sq]) * MAGIC[sq]) >> SHIFT[sq]],
+# where MASK holds the squares whose occupancy can block the slider.
+# The magics below were found offline with a fixed-seed sparse random search
+# for this module's square numbering (a8 = 0, h1 = 63).
+
+MASK_64 = (1 << 64) - 1
+
+ROOK_MAGICS = [
+    0x2080001440022581, 0x1080200040001080, 0x4080100008200080, 0x0280080080100254,
+    0x4D8004000A180080, 0x0100080400020100, 0x1080010040800200, 0x0200004402002081,
+    0x0068800024884004, 0x1000804000802002, 0x000200208A001040, 0x3008801000800800,
+    0x2006001060440A00, 0x1000800200800400, 0x0004000441024810, 0xA001000082004100,
+    0x0040808000204014, 0x0000424002201000, 0x0010110041002000, 0x0000090021041000,
+    0x0204008004800800, 0x0000808004000200, 0x6006040021485042, 0x0000020002409924,
+    0x2000401980028020, 0x4000400100308100, 0x0000820200201041, 0xB100100080800800,
+    0x3004080080040080, 0x0802000200041009, 0x01A0580400021110, 0x00020042000408A1,
+    0x4218884000800023, 0x0480201000400045, 0x0010200080801000, 0x1200200901001000,
+    0x0000100801000500, 0x0080020080800400, 0x004A000100404080, 0x0480005402001081,
+    0x258000402000C000, 0xA010004820084002, 0x0480200010008080, 0x244100100021000C,
+    0x2040080005010010, 0x0012000810020004, 0x0011000200B9000C, 0x1121000080410002,
+    0x00082080410A0600, 0x4002008100402600, 0x0A0300E008544100, 0x7B00080010008080,
+    0x0300080100100500, 0x0002020080040080, 0x0042521810214400, 0x8A00004089140200,
+    0x00001280010A2041, 0x0400401102042086, 0x41902000100C4101, 0x0043020420900009,
+    0x00E2000410082002, 0x4402000108041002, 0x2100101A00814804, 0x0400010400218246,
+]
+
+BISHOP_MAGICS = [
+    0x0102040418220020, 0x0108024802002028, 0x8010044040400001, 0x0022209200044800,
+    0x4004504005040114, 0x0022010420A80800, 0x0008441008090002, 0x0000420801480200,
+    0x1100220244011C00, 0x00883004081AB020, 0x4400100152002000, 0x4019080841004000,
+    0x2861021210000000, 0x400EA10108400020, 0x4800208208A24000, 0x0020A500A0842085,
+    0x3410000802504400, 0x0010E0200C010060, 0x0014182042408200, 0x4094006840112109,
+    0x2014200202010000, 0x000100020080C400, 0x800400420D2C0200, 0x0002200182251000,
+    0x0010F10304C41000, 0x001024A008281084, 0x0088110002040100, 0x0820080001004008,
+    0x0104040020410050, 0x0110002027040500, 0x418C008009182100, 0x2C00A9040C80480B,
+    0x008110C8005020A4, 0x4004210802041000, 0x0004020108208100, 0x0000080800120A00,
+    0x430C008400820102, 0x1400808100020108, 0x005006020010A8A0, 0x000801868004A220,
+    0x00420105C00C2000, 0x1010921032019040, 0x0300222028103000, 0x0008004208001080,
+    0x5410202248811400, 0x0008010800800808, 0x3C02C20404000900, 0x0408022282040032,
+    0x0000941002100000, 0x0112209A10100804, 0x080C020111210000, 0x442002A442022008,
+    0x00084A181B040000, 0x00115021021C2080, 0x4010051000A20000, 0x0404688085060000,
+    0x0000220110011000, 0x140000220734200C, 0x0440010424020800, 0x2204828883460800,
+    0x0020000004050410, 0x4060004A20082080, 0x00489034B002C201, 0x0444049010410300,
 ]
 
-# Track castling rights for each color: [kingside, queenside]
-CASTLE_RIGHTS = {
-    "white": [True, True],
-    "black": [True, True]
+def square_bb(squares):
+    """Return a bitboard with every square in the iterable set."""
+    bb = 0
+    for sq in squares:
+        bb |= 1 << sq
+    return bb
+
+def build_blocker_masks(slides):
+    """
+    Build the relevant-blocker mask for each square from its rays.
+    The last square of each ray is left out: a piece there cannot
+    block anything further along the ray.
+    """
+    return tuple(square_bb(sq for ray in rays for sq in ray[:-1]) for rays in slides)
+
+def ray_attacks(rays, occ):
+    """
+    Attack bitboard along the given rays for occupancy occ, walking each
+    ray until (and including) the first occupied square. Only used to fill
+    the magic tables at import time.
+    """
+    attacks = 0
+    for ray in rays:
+        for sq in ray:
+            bit = 1 << sq
+            attacks |= bit
+            if occ & bit:
+                break
+    return attacks
+
+def build_magic_table(slides, masks, magics):
+    """
+    Fill the per-square attack tables for one slider type.
+    Enumerates every subset of each blocker mask (carry-rippler) and stores
+    its attack set at the magic index. Returns (shifts, tables).
+    """
+    shifts = [0] * 64
+    tables = [None] * 64
+    for sq, rays in enumerate(slides):
+        mask, magic = masks[sq], magics[sq]
+        shift = 64 - mask.bit_count()
+        table = [0] * (1 << (64 - shift))
+        occ = 0
+        while True:
+            idx = ((occ * magic) & MASK_64) >> shift
+            attacks = ray_attacks(rays, occ)
+            if table[idx] and table[idx] != attacks:
+                raise ValueError(f"Bad magic for square {sq}")
+            table[idx] = attacks
+            occ = (occ - mask) & mask
+            if not occ:
+                break
+        shifts[sq] = shift
+        tables[sq] = tuple(table)
+    return tuple(shifts), tuple(tables)
+
+ROOK_MASKS = build_blocker_masks(ROOK_SLIDES)
+BISHOP_MASKS = build_blocker_masks(BISHOP_SLIDES)
+ROOK_SHIFTS, ROOK_ATTACKS = build_magic_table(ROOK_SLIDES, ROOK_MASKS, ROOK_MAGICS)
+BISHOP_SHIFTS, BISHOP_ATTACKS = build_magic_table(BISHOP_SLIDES, BISHOP_MASKS, BISHOP_MAGICS)
+
+def build_between(slides, between):
+    """
+    Fill between[frm][to] for every pair of squares on a common ray:
+    the bitboard of squares strictly between them.
+    """
+    for frm, rays in enumerate(slides):
+        for ray in rays:
+            passed = 0
+            for to in ray:
+                between[frm][to] = passed
+                passed |= 1 << to
+
+# Squares strictly between two aligned squares (0 when not aligned)
+BETWEEN = [[0] * 64 for _ in range(64)]
+build_between(ROOK_SLIDES, BETWEEN)
+build_between(BISHOP_SLIDES, BETWEEN)
+
+# Rook and bishop lines from each square on an empty board
+ROOK_LINES = tuple(square_bb(sq for ray in rays for sq in ray) for rays in ROOK_SLIDES)
+BISHOP_LINES = tuple(square_bb(sq for ray in rays for sq in ray) for rays in BISHOP_SLIDES)
+
+def rook_attacks(sq, occ):
+    """Bitboard of squares a rook on sq attacks given occupancy occ."""
+    return ROOK_ATTACKS[sq][(((occ & ROOK_MASKS[sq]) * ROOK_MAGICS[sq]) & MASK_64) >> ROOK_SHIFTS[sq]]
+
+def bishop_attacks(sq, occ):
+    """Bitboard of squares a bishop on sq attacks given occupancy occ."""
+    return BISHOP_ATTACKS[sq][(((occ & BISHOP_MASKS[sq]) * BISHOP_MAGICS[sq]) & MASK_64) >> BISHOP_SHIFTS[sq]]
+
+def queen_attacks(sq, occ):
+    """Bitboard of squares a queen on sq attacks given occupancy occ."""
+    return rook_attacks(sq, occ) | bishop_attacks(sq, occ)
+
+def knight_attacks(sq, occ):
+    """Knight attacks from sq; occ is unused but keeps the slider signature."""
+    return KNIGHT_ATTACKS[sq]
+
+def king_attacks(sq, occ):
+    """King attacks from sq; occ is unused but keeps the slider signature."""
+    return KING_ATTACKS[sq]
+
+########################################
+# Leaper and pawn attack bitboards
+########################################
+
+def build_attack_bbs(moves):
+    """Convert a per-square destinations table into 64 attack bitboards."""
+    return tuple(square_bb(dests) for dests in moves)
+
+def build_pawn_attacks(direction):
+    """
+    Bitboards of the two diagonal squares a pawn on each square attacks.
+    direction is -1 for white (moving up the board) and +1 for black.
+    """
+    attacks = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        attacks.append(square_bb(
+            (r + direction) * 8 + cc for cc in (c - 1, c + 1) if in_bounds(r + direction, cc)
+        ))
+    return tuple(attacks)
+
+KNIGHT_ATTACKS = build_attack_bbs(KNIGHT_MOVES)
+KING_ATTACKS = build_attack_bbs(KING_MOVES)
+PAWN_ATTACKS_W = build_pawn_attacks(-1)
+PAWN_ATTACKS_B = build_pawn_attacks(1)
+
+def build_pawn_pushes(direction, start_row):
+    """
+    Bitboards of the single-step and double-step push targets of a pawn
+    on each square. Double-step targets are only set on start_row.
+    Returns (pushes, doubles).
+    """
+    pushes = []
+    doubles = []
+    for sq in range(64):
+        r = sq >> 3
+        pushes.append(1 << (sq + 8 * direction) if 0 <= r + direction < 8 else 0)
+        doubles.append(1 << (sq + 16 * direction) if r == start_row else 0)
+    return tuple(pushes), tuple(doubles)
+
+# Pawn tables indexed by side (0 = white, 1 = black) and then square
+PAWN_PUSH_W, PAWN_DOUBLE_W = build_pawn_pushes(-1, 6)
+PAWN_PUSH_B, PAWN_DOUBLE_B = build_pawn_pushes(1, 1)
+PAWN_PUSH = (PAWN_PUSH_W, PAWN_PUSH_B)
+PAWN_DOUBLE = (PAWN_DOUBLE_W, PAWN_DOUBLE_B)
+PAWN_ATTACKS = (PAWN_ATTACKS_W, PAWN_ATTACKS_B)
+
+# Other per-side constants, indexed the same way
+COLORS = ('white', 'black')
+PROMO_ROW = (0, 7)
+HOME_SQ = (56, 0)  # a1, a8
+
+# Files a and h, used to stop pawn captures wrapping around the board edge
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+
+########################################
+# Board setup + utilities
+########################################
+
+@dataclass
+class Position:
+    """
+    Bitboard board state.
+    Each piece field holds a 64-bit int with bit (row*8 + col) set for every
+    square occupied by that piece. occ_w, occ_b and occ are the white, black
+    and total occupancy masks, and key is the Zobrist hash of the piece
+    placement.
+    squares is a 64-byte mailbox of piece codes (see PIECE_CODES,
+    0 = empty) so "what is on this square" is a single index rather than a
+    scan of the twelve bitboards.
+    All of these are kept in sync by put_piece and xor_piece.
+    """
+    wp: int = 0
+    wn: int = 0
+    wb: int = 0
+    wr: int = 0
+    wq: int = 0
+    wk: int = 0
+    bp: int = 0
+    bn: int = 0
+    bb: int = 0
+    br: int = 0
+    bq: int = 0
+    bk: int = 0
+    occ_w: int = 0
+    occ_b: int = 0
+    occ: int = 0
+    key: int = 0
+    squares: bytearray = field(default_factory=lambda: bytearray(64))
+
+# Position field holding each piece's bitboard
+PIECE_FIELDS = {
+    'P': 'wp', 'N': 'wn', 'B': 'wb', 'R': 'wr', 'Q': 'wq', 'K': 'wk',
+    'p': 'bp', 'n': 'bn', 'b': 'bb', 'r': 'br', 'q': 'bq', 'k': 'bk',
 }
 
-def copy_board(board):
-    """Create a deep copy of the board state."""
-    return [row[:] for row in board]
+# Piece codes used by Position.squares: color << 3 | type,
+# so code & 7 is the piece type and code >> 3 the side (0 white, 1 black).
+# 0 is an empty square; codes 7, 8 and 15 are unused.
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+BLACK = 8
+PIECE_CODES = ".PNBRQK..pnbrqk."
+PIECE_INDEX = {'.': 0, **{piece: code for code, piece in enumerate(PIECE_CODES) if piece != '.'}}
+# bytes.translate table from piece codes to piece letters
+PIECE_CODE_CHARS = bytes.maketrans(bytes(range(len(PIECE_CODES))), PIECE_CODES.encode())
+
+# Zobrist keys: one random 64-bit value per (piece, square), plus keys for
+# side to move, each castling right and the en passant file. A position's
+# hash is the XOR of the keys for everything present. Seeded so hashes are
+# stable between runs.
+_zobrist_rng = random.Random(0x5EED)
+ZOBRIST_PIECES = {
+    piece: [_zobrist_rng.getrandbits(64) for _ in range(64)]
+    for piece in PIECE_FIELDS
+}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_rng.getrandbits(64)
+_zobrist_rights = [_zobrist_rng.getrandbits(64) for _ in range(4)]  # WK, WQ, BK, BQ
+ZOBRIST_EP_FILE = [_zobrist_rng.getrandbits(64) for _ in range(8)]
 
-def get_piece_color(piece):
+def build_castling_keys(right_keys):
     """
-    Returns the color of a piece or None if square is empty.
-    piece: Single character representing the piece ('K','k','Q', etc)
+    Combined castling key for each of the 16 possible rights values:
+    the XOR of the keys in right_keys (WK, WQ, BK, BQ order) whose bit is set.
     """
-    if piece == ".":
-        return None
-    return "white" if piece.isupper() else "black"
+    keys = []
+    for rights in range(16):
+        key = 0
+        for bit, right_key in enumerate(right_keys):
+            if rights >> bit & 1:
+                key ^= right_key
+        keys.append(key)
+    return keys
+
+ZOBRIST_CASTLING = build_castling_keys(_zobrist_rights)
+
+def set_bit(bb, sq):
+    """Return bitboard bb with square sq set."""
+    return bb | (1 << sq)
+
+def clear_bit(bb, sq):
+    """Return bitboard bb with square sq cleared."""
+    return bb & ~(1 << sq)
+
+def iter_bits(bb):
+    """
+    Yield the index of each set bit in bb, lowest first.
+    Isolates the least significant bit with bb & -bb, so the loop runs
+    once per piece rather than once per square.
+    """
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
 
-def is_white(piece):
-    """Returns True if piece is white (uppercase)."""
-    return piece.isupper()
+def piece_at(board, sq):
+    """Return the piece character on square sq, or '.' if empty."""
+    return PIECE_CODES[board.squares[sq]]
 
-def is_black(piece):
-    """Returns True if piece is black (lowercase)."""
-    return piece.islower()
+def put_piece(board, sq, piece):
+    """
+    Place piece on square sq, replacing whatever was there.
+    Passing '.' empties the square. Updates the occupancy masks.
+    """
+    old_code = board.squares[sq]
+    if old_code:
+        old = PIECE_CODES[old_code]
+        attr = PIECE_FIELDS[old]
+        setattr(board, attr, clear_bit(getattr(board, attr), sq))
+        board.key ^= ZOBRIST_PIECES[old][sq]
+        if old_code & BLACK:
+            board.occ_b = clear_bit(board.occ_b, sq)
+        else:
+            board.occ_w = clear_bit(board.occ_w, sq)
+    code = PIECE_INDEX[piece]
+    if code:
+        attr = PIECE_FIELDS[piece]
+        setattr(board, attr, set_bit(getattr(board, attr), sq))
+        board.key ^= ZOBRIST_PIECES[piece][sq]
+        if code & BLACK:
+            board.occ_b = set_bit(board.occ_b, sq)
+        else:
+            board.occ_w = set_bit(board.occ_w, sq)
+    board.occ = board.occ_w | board.occ_b
+    board.squares[sq] = code
+
+def board_from_rows(rows):
+    """
+    Build a Position from 8 strings of piece characters, rank 8 first.
+    """
+    board = Position()
+    for r, row in enumerate(rows):
+        for c, piece in enumerate(row):
+            if piece != '.':
+                put_piece(board, r * 8 + c, piece)
+    return board
+
+def board_to_rows(board):
+    """
+    Inverse of board_from_rows: 8 strings of piece characters, rank 8
+    first, read from the mailbox with one bytes.translate.
+    """
+    pieces = board.squares.translate(PIECE_CODE_CHARS).decode()
+    return [pieces[r * 8:r * 8 + 8] for r in range(8)]
+
+STARTING_BOARD = board_from_rows([
+    "rnbqkbnr",  # Black pieces
+    "pppppppp",  # Black pawns
+    "........",  # Empty squares
+    "........",
+    "........",
+    "........",
+    "PPPPPPPP",  # White pawns
+    "RNBQKBNR",  # White pieces
+])
+
+# Castling rights are packed into a 4-bit int, one bit per right
+WK, WQ, BK, BQ = 1, 2, 4, 8
+CASTLE_RIGHTS = WK | WQ | BK | BQ
+
+# Rights lost when a piece moves from, or is captured on, each square
+CASTLE_LOSS = [0] * 64
+CASTLE_LOSS[60] = WK | WQ  # e1
+CASTLE_LOSS[63] = WK       # h1
+CASTLE_LOSS[56] = WQ       # a1
+CASTLE_LOSS[4] = BK | BQ   # e8
+CASTLE_LOSS[7] = BK        # h8
+CASTLE_LOSS[0] = BQ        # a8
+
+# Per (color, side): the right needed, the rook's home square, the squares
+# that must be empty, and the squares the king stands on or crosses (none
+# of which may be attacked)
+CASTLE_RIGHT = {
+    ('white', 'king'): WK, ('white', 'queen'): WQ,
+    ('black', 'king'): BK, ('black', 'queen'): BQ,
+}
+CASTLE_ROOK = {
+    ('white', 'king'): 63, ('white', 'queen'): 56,
+    ('black', 'king'): 7, ('black', 'queen'): 0,
+}
+CASTLE_BETWEEN = {
+    ('white', 'king'): (1 << 61) | (1 << 62),
+    ('white', 'queen'): (1 << 57) | (1 << 58) | (1 << 59),
+    ('black', 'king'): (1 << 5) | (1 << 6),
+    ('black', 'queen'): (1 << 1) | (1 << 2) | (1 << 3),
+}
+CASTLE_KING_PATH = {
+    ('white', 'king'): (1 << 60) | (1 << 61) | (1 << 62),
+    ('white', 'queen'): (1 << 60) | (1 << 59) | (1 << 58),
+    ('black', 'king'): (1 << 4) | (1 << 5) | (1 << 6),
+    ('black', 'queen'): (1 << 4) | (1 << 3) | (1 << 2),
+}
+
+def copy_board(board):
+    """Create a copy of the board state (a handful of ints and 64 bytes)."""
+    return replace(board, squares=bytearray(board.squares))
+
+def position_key(board, color, castling_rights, en_passant_target):
+    """
+    Zobrist hash of the full game state: piece placement (kept on the
+    board), side to move, castling rights and en passant file.
+    """
+    key = board.key ^ ZOBRIST_CASTLING[castling_rights]
+    if color == 'black':
+        key ^= ZOBRIST_BLACK_TO_MOVE
+    if en_passant_target is not None:
+        key ^= ZOBRIST_EP_FILE[en_passant_target & 7]
+    return key
 
 def print_board(board):
     """
@@ -168,29 +555,35 @@ def print_board(board):
     Uses chess notation: a-h for files (columns), 1-8 for ranks (rows).
     """
     print("  a b c d e f g h")
-    for i in range(8):
-        row_str = str(8 - i) + " "
-        for j in range(8):
-            row_str += board[i][j] + " "
-        print(row_str + str(8 - i))
+    for i, row in enumerate(board_to_rows(board)):
+        print(f"{8 - i} {' '.join(row)} {8 - i}")
     print("  a b c d e f g h")
 
+# Moves are packed into a single int:
+#   bits 0-5    from square
+#   bits 6-11   to square
+# The piece, capture and kind of move are read from the board when needed.
+
+def mk_move(frm, to):
+    """Pack a move into a single int (see the layout above)."""
+    return frm | (to << 6)
+
+# Two squares a1-h8 separated by whitespace, e.g. 'e2 e4'
+MOVE_RE = re.compile(r'([a-h])([1-8])\s+([a-h])([1-8])')
+
 def parse_move(move_str):
     """
-    Convert a move string (e.g. 'e2 e4') to board coordinates.
-    Returns tuple of ((start_row, start_col), (end_row, end_col)) or (None, None) if invalid.
-    """
-    try:
-        start_str, end_str = move_str.split()
-        # Convert file (a-h) to column (0-7)
-        c1 = ord(start_str[0].lower()) - ord('a')
-        # Convert rank (1-8) to row (7-0)
-        r1 = 8 - int(start_str[1])
-        c2 = ord(end_str[0].lower()) - ord('a')
-        r2 = 8 - int(end_str[1])
-        return (r1, c1), (r2, c2)
-    except:
-        return None, None
+    Convert a move string (e.g. 'e2 e4') to a packed move (see mk_move).
+    Returns None if the string is not a pair of squares between a1 and h8.
+    """
+    m = MOVE_RE.fullmatch(move_str.strip().lower())
+    if not m:
+        return None
+    file1, rank1, file2, rank2 = m.groups()
+    # Convert file (a-h) to column (0-7) and rank (1-8) to row (7-0)
+    start = (ord('8') - ord(rank1)) * 8 + ord(file1) - ord('a')
+    end = (ord('8') - ord(rank2)) * 8 + ord(file2) - ord('a')
+    return mk_move(start, end)
 
 ########################################
 # Check logic 
@@ -199,227 +592,321 @@ def parse_move(move_str):
 def find_king_position(board, color):
     """
     Find the position of the king of given color.
-    Returns (row, col) tuple or None if not found.
+    Returns its square index or None if not found.
     """
-    king_char = 'K' if color == 'white' else 'k'
-    for r in range(8):
-        for c in range(8):
-            if board[r][c] == king_char:
-                return (r, c)
-    return None
+    king_bb = board.wk if color == 'white' else board.bk
+    if not king_bb:
+        return None
+    return king_bb.bit_length() - 1
 
-def square_attacked_by(board, r, c, color):
+def square_attacked_by(board, sq, color):
     """
-    Returns True if any piece of 'color' can legally move to square (r,c).
+    Returns True if any piece of 'color' attacks square sq.
     Used for check detection and castling validation.
+
+    Works backwards from the target: a knight on sq would attack exactly
+    the squares enemy knights could attack it from, and likewise for the
+    other piece types, so each type is one table lookup and one AND.
+    The cheap leaper tests go first and the first hit returns; the magic
+    lookups are skipped when the side has no slider of that kind.
     """
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-            if piece != '.' and get_piece_color(piece) == color:
-                if is_valid_move(
-                    board, (row, col), (r, c),
-                    color == "white", 
-                    en_passant_target=None,
-                    castling_rights=None,
-                    checking_check=False  # Prevent infinite recursion
-                ):
-                    return True
-    return False
+    if color == 'white':
+        # White pawns attacking sq sit where a black pawn on sq would attack
+        if (PAWN_ATTACKS_B[sq] & board.wp
+                or KNIGHT_ATTACKS[sq] & board.wn
+                or KING_ATTACKS[sq] & board.wk):
+            return True
+        diagonal = board.wb | board.wq
+        straight = board.wr | board.wq
+    else:
+        if (PAWN_ATTACKS_W[sq] & board.bp
+                or KNIGHT_ATTACKS[sq] & board.bn
+                or KING_ATTACKS[sq] & board.bk):
+            return True
+        diagonal = board.bb | board.bq
+        straight = board.br | board.bq
+    occ = board.occ
+    if diagonal and bishop_attacks(sq, occ) & diagonal:
+        return True
+    return bool(straight and rook_attacks(sq, occ) & straight)
+
+def attacks_by(board, color):
+    """
+    Bitboard of every square attacked by a piece of 'color'.
+    Pawn captures are shifted in bulk; other pieces are looked up one at a
+    time. Cheaper than square_attacked_by when several squares are tested.
+    """
+    occ = board.occ
+    if color == 'white':
+        pawns = board.wp
+        attacked = ((pawns & ~FILE_A) >> 9) | ((pawns & ~FILE_H) >> 7)
+        knights, king = board.wn, board.wk
+        diagonal = board.wb | board.wq
+        straight = board.wr | board.wq
+    else:
+        pawns = board.bp
+        attacked = (((pawns & ~FILE_A) << 7) | ((pawns & ~FILE_H) << 9)) & MASK_64
+        knights, king = board.bn, board.bk
+        diagonal = board.bb | board.bq
+        straight = board.br | board.bq
+    for sq in iter_bits(knights):
+        attacked |= KNIGHT_ATTACKS[sq]
+    for sq in iter_bits(diagonal):
+        attacked |= bishop_attacks(sq, occ)
+    for sq in iter_bits(straight):
+        attacked |= rook_attacks(sq, occ)
+    for sq in iter_bits(king):
+        attacked |= KING_ATTACKS[sq]
+    return attacked
+
+# Size at which each result cache below is emptied
+CACHE_SIZE = 1 << 16
+
+def cached_call(cache, key, compute, *args):
+    """
+    Return cache[key], computing it as compute(*args) and storing it on a
+    miss. The cache is emptied first when it holds CACHE_SIZE entries.
+    """
+    value = cache.get(key)
+    if value is None:
+        if len(cache) >= CACHE_SIZE:
+            cache.clear()
+        value = cache[key] = compute(*args)
+    return value
+
+# in_check results keyed by piece-placement hash, with the side-to-move key
+# mixed in for black. Check depends on nothing else. The same placements
+# come up again through other move orders, so the king-move and en passant
+# probes in iter_legal_moves and is_valid_move often hit.
+CHECK_CACHE = {}
 
 def in_check(board, color):
     """
     Returns True if the king of 'color' is in check.
     A king is in check if it can be captured by any enemy piece.
+    Results are cached by piece-placement hash and side.
     """
-    king_pos = find_king_position(board, color)
-    if not king_pos:
-        return False
-    (r, c) = king_pos
-    opponent = 'white' if color == 'black' else 'black'
-    return square_attacked_by(board, r, c, opponent)
+    if color == 'white':
+        key = board.key
+        king, opponent = board.wk, 'black'
+    else:
+        key = board.key ^ ZOBRIST_BLACK_TO_MOVE
+        king, opponent = board.bk, 'white'
+    return cached_call(CHECK_CACHE, key, _in_check, board, king, opponent)
+
+def _in_check(board, king, opponent):
+    """Uncached body of in_check."""
+    return bool(king) and square_attacked_by(board, king.bit_length() - 1, opponent)
+
+# compute_king_info results, keyed like CHECK_CACHE
+KING_INFO_CACHE = {}
+
+def compute_king_info(board, color):
+    """
+    Work out what constrains the moves of 'color' around its king.
+    Returns (checkers, pinned, pin_rays, block_mask):
+    - checkers: bitboard of enemy pieces giving check
+    - pinned: bitboard of own pieces pinned to the king
+    - pin_rays: dict mapping each pinned square to the squares it may
+      still move to (the line between king and pinner, pinner included)
+    - block_mask: squares a non-king move must land on to deal with
+      check (everything when not in check, nothing in double check)
+    Results depend only on piece placement and are cached by Zobrist key.
+    """
+    key = board.key if color == 'white' else board.key ^ ZOBRIST_BLACK_TO_MOVE
+    return cached_call(KING_INFO_CACHE, key, _compute_king_info, board, color)
+
+def _compute_king_info(board, color):
+    """Uncached body of compute_king_info."""
+    if color == 'white':
+        king, own = board.wk, board.occ_w
+        pawns, knights = board.bp, board.bn
+        diagonal = board.bb | board.bq
+        straight = board.br | board.bq
+        pawn_attacks = PAWN_ATTACKS_W
+    else:
+        king, own = board.bk, board.occ_b
+        pawns, knights = board.wp, board.wn
+        diagonal = board.wb | board.wq
+        straight = board.wr | board.wq
+        pawn_attacks = PAWN_ATTACKS_B
+    if not king:
+        return 0, 0, {}, MASK_64
+    ksq = king.bit_length() - 1
+    occ = board.occ
+
+    checkers = (KNIGHT_ATTACKS[ksq] & knights) | (pawn_attacks[ksq] & pawns)
+    pinned = 0
+    pin_rays = {}
+    # Enemy sliders on an open line to the king either give check or,
+    # with exactly one of our pieces in between, pin it
+    snipers = (ROOK_LINES[ksq] & straight) | (BISHOP_LINES[ksq] & diagonal)
+    for sq in iter_bits(snipers):
+        between = BETWEEN[ksq][sq]
+        blockers = between & occ
+        if not blockers:
+            checkers |= 1 << sq
+        elif blockers & own and not blockers & (blockers - 1):
+            pinned |= blockers
+            pin_rays[blockers.bit_length() - 1] = between | (1 << sq)
+
+    if not checkers:
+        block_mask = MASK_64
+    elif checkers & (checkers - 1):
+        block_mask = 0
+    else:
+        block_mask = checkers | BETWEEN[ksq][checkers.bit_length() - 1]
+    return checkers, pinned, pin_rays, block_mask
 
 ########################################
 # Move validation
 ########################################
 
-def is_valid_move(
-    board, start, end, turn_white,
-    en_passant_target, castling_rights,
-    checking_check=True
-):
+def is_valid_move(board, move, turn_white, en_passant_target, castling_rights):
     """
-    Check if a move from start to end is legal.
+    Check if a move is legal.
     
     Parameters:
     - board: Current board state
-    - start: (row, col) tuple for starting square
-    - end: (row, col) tuple for ending square
+    - move: Packed move (see mk_move)
     - turn_white: True if it's white's turn
     - en_passant_target: Square that can be captured via en passant, or None
-    - castling_rights: Dict tracking castling availability
-    - checking_check: If True, verify move doesn't leave king in check
+    - castling_rights: Castling rights bits (WK, WQ, BK, BQ)
     
-    Returns: True if move is legal
+    Returns: True if the move follows the piece's rules and does not
+    leave the mover's king in check
     """
-    r1, c1 = start
-    r2, c2 = end
+    return (
+        is_pseudo_legal(board, move, turn_white, en_passant_target, castling_rights)
+        and keeps_king_safe(board, move, turn_white, en_passant_target)
+    )
 
-    # Basic bounds checking
-    if not in_bounds(r1, c1) or not in_bounds(r2, c2):
-        return False
+def keeps_king_safe(board, move, turn_white, en_passant_target):
+    """
+    Check that a move already known to pass is_pseudo_legal does not
+    leave the mover's king in check.
+    """
+    # Other than king moves and en passant, the pin and check masks decide
+    # king safety without playing the move
+    side = 0 if turn_white else 1
+    color = COLORS[side]
+    frm = move & 63
+    to = (move >> 6) & 63
+    kind = board.squares[frm] & 7
+    if kind != KING and not (kind == PAWN and to == en_passant_target):
+        checkers, pinned, pin_rays, block_mask = compute_king_info(board, color)
+        if not block_mask >> to & 1:
+            return False
+        return not pinned >> frm & 1 or bool(pin_rays[frm] >> to & 1)
 
-    piece = board[r1][c1]
-    if piece == '.':
-        return False
+    # Verify move doesn't leave/put own king in check
+    undo = make_move(board, move)
+    left_in_check = in_check(board, color)
+    unmake_move(board, undo)
+    return not left_in_check
 
-    # Verify correct color is moving
-    piece_color = "white" if is_white(piece) else "black"
-    if turn_white and piece_color != "white":
-        return False
-    if (not turn_white) and piece_color != "black":
+def is_pseudo_legal(board, move, turn_white, en_passant_target, castling_rights):
+    """
+    Check a move against the movement rules of the piece being moved,
+    without checking whether it leaves the mover's king in check.
+    Takes the same parameters as is_valid_move.
+    """
+    frm = move & 63
+    to = (move >> 6) & 63
+
+    # Verify a piece of the correct color is moving
+    own = board.occ_w if turn_white else board.occ_b
+    if not own & (1 << frm):
         return False
 
-    target = board[r2][c2]
     # Can't capture your own piece
-    if target != '.' and get_piece_color(target) == piece_color:
+    if own & (1 << to):
         return False
 
     # Check piece-specific move rules
-    p = piece.upper()
-    if p == 'P':
-        if not valid_pawn_move(board, start, end, turn_white, en_passant_target):
-            return False
-    elif p == 'N':
-        if end not in KNIGHT_MOVES[start]:
-            return False
-    elif p == 'B':
-        if not valid_bishop_move(board, start, end):
-            return False
-    elif p == 'R':
-        if not valid_rook_move(board, start, end):
-            return False
-    elif p == 'Q':
-        if not valid_queen_move(board, start, end):
-            return False
-    elif p == 'K':
-        # Normal king moves
-        if end in KING_MOVES[start]:
-            pass
-        else:
-            # Attempting castling
-            color = "white" if turn_white else "black"
-            side = None
-            if (r2, c2) == ((7, 6) if color == "white" else (0, 6)):
-                side = 'king'
-            elif (r2, c2) == ((7, 2) if color == "white" else (0, 2)):
-                side = 'queen'
-            if side:
-                if castling_rights is None:
-                    return False
-                color_castle_rights = castling_rights.get(color, [False, False])
-                if not can_castle(board, color, side, color_castle_rights):
-                    return False
-            else:
-                return False
-    else:
-        return False
+    validator = VALIDATORS[board.squares[frm] & 7]
+    return validator(board, frm, to, turn_white, en_passant_target, castling_rights)
 
-    if not checking_check:
-        return True
-
-    # Verify move doesn't leave/put own king in check
-    temp = copy_board(board)
-    temp_cr = {
-        "white": castling_rights["white"][:] if castling_rights else [True, True],
-        "black": castling_rights["black"][:] if castling_rights else [True, True]
-    }
-    temp_enp, _ = move_with_extras(
-        temp, start, end, turn_white,
-        en_passant_target, temp_cr
-    )
-    if in_check(temp, piece_color):
-        return False
-
-    return True
-
-def valid_pawn_move(board, start, end, turn_white, en_passant_target):
+def valid_pawn_move(board, frm, to, turn_white, en_passant_target, castling_rights):
     """
     Validate a pawn move according to chess rules:
     - Can move forward one square if target is empty
     - Can move forward two squares from starting position if path is clear
     - Can capture diagonally
     - Can capture en passant
-    """
-    r1, c1 = start
-    r2, c2 = end
-    piece = board[r1][c1]
-    direction = -1 if turn_white else 1  # White moves up (-1), black moves down (+1)
-    start_row = 6 if turn_white else 1   # Starting row for pawns
-    enemy_color = 'black' if turn_white else 'white'
-
-    # Single-step forward
-    if c1 == c2 and (r2 == r1 + direction) and board[r2][c2] == '.':
-        return True
 
-    # Double-step from starting position
-    if c1 == c2 and r1 == start_row and r2 == r1 + 2*direction:
-        mid_r = r1 + direction
-        if board[mid_r][c1] == '.' and board[r2][c2] == '.':
-            return True
-
-    # Diagonal capture or en passant
-    if abs(c2 - c1) == 1 and r2 == r1 + direction:
-        # Normal diagonal capture
-        if board[r2][c2] != '.' and get_piece_color(board[r2][c2]) == enemy_color:
-            return True
-        # En passant capture
-        if en_passant_target is not None:
-            if (r2, c2) == en_passant_target and board[r2][c2] == '.':
-                return True
-
-    return False
-
-def valid_rook_move(board, start, end):
+    All four cases are table lookups ORed into one bitboard of reachable
+    targets, which is then tested against the target square.
     """
-    Validate a rook move using precomputed sliding moves.
-    Checks if target is reachable along any ray and path is clear.
+    side = 0 if turn_white else 1
+    occ = board.occ
+    empty = ~occ
+    enemy = board.occ_b if turn_white else board.occ_w
+    if en_passant_target is not None:
+        enemy |= (1 << en_passant_target) & empty
+
+    # The double step needs the single-step square clear as well
+    push = PAWN_PUSH[side][frm]
+    double = 0 if push & occ else PAWN_DOUBLE[side][frm]
+
+    return bool((1 << to) & (
+        ((push | double) & empty)
+        | (PAWN_ATTACKS[side][frm] & enemy)
+    ))
+
+def valid_knight_move(board, frm, to, turn_white, en_passant_target, castling_rights):
+    """Validate a knight move with a single attack table lookup."""
+    return bool(KNIGHT_ATTACKS[frm] & (1 << to))
+
+def valid_rook_move(board, frm, to, turn_white, en_passant_target, castling_rights):
     """
-    for ray in ROOK_SLIDES[start]:
-        if end in ray:
-            for sq in ray:
-                if sq == end:
-                    return True
-                if board[sq[0]][sq[1]] != '.':
-                    return False
-    return False
+    Validate a rook move: the target must lie on one of the rook's lines
+    and every square between them must be empty.
+    """
+    return bool(ROOK_LINES[frm] >> to & 1) and not BETWEEN[frm][to] & board.occ
 
-def valid_bishop_move(board, start, end):
+def valid_bishop_move(board, frm, to, turn_white, en_passant_target, castling_rights):
     """
-    Validate a bishop move using precomputed sliding moves.
-    Checks if target is reachable along any ray and path is clear.
+    Validate a bishop move: the target must lie on one of the bishop's
+    diagonals and every square between them must be empty.
     """
-    for ray in BISHOP_SLIDES[start]:
-        if end in ray:
-            for sq in ray:
-                if sq == end:
-                    return True
-                if board[sq[0]][sq[1]] != '.':
-                    return False
-    return False
+    return bool(BISHOP_LINES[frm] >> to & 1) and not BETWEEN[frm][to] & board.occ
 
-def valid_queen_move(board, start, end):
+def valid_queen_move(board, frm, to, turn_white, en_passant_target, castling_rights):
     """
     Validate a queen move by checking both rook and bishop patterns.
     A queen combines the movement capabilities of a rook and bishop.
     """
     # Queen = Rook + Bishop
-    if valid_rook_move(board, start, end):
-        return True
-    if valid_bishop_move(board, start, end):
+    lines = ROOK_LINES[frm] | BISHOP_LINES[frm]
+    return bool(lines >> to & 1) and not BETWEEN[frm][to] & board.occ
+
+def valid_king_move(board, frm, to, turn_white, en_passant_target, castling_rights):
+    """
+    Validate a king move: one step in any direction, or two steps along
+    the home rank when castling is allowed (see can_castle).
+    """
+    if KING_ATTACKS[frm] & (1 << to):
         return True
+    # Attempting castling
+    side = 0 if turn_white else 1
+    color = COLORS[side]
+    home = HOME_SQ[side]
+    if to == home + 6:
+        return can_castle(board, color, 'king', castling_rights)
+    if to == home + 2:
+        return can_castle(board, color, 'queen', castling_rights)
     return False
 
+# Validator for each piece type (code & 7, see PIECE_CODES). All validators
+# take (board, frm, to, turn_white, en_passant_target, castling_rights) so
+# that is_pseudo_legal can dispatch with one index and one call.
+VALIDATORS = (
+    None,
+    valid_pawn_move, valid_knight_move, valid_bishop_move,
+    valid_rook_move, valid_queen_move, valid_king_move,
+)
+
 ########################################
 # Castling, en passant, promotion
 ########################################
@@ -431,7 +918,7 @@ def can_castle(board, color, side, castling_rights):
     Parameters:
     - color: 'white' or 'black'
     - side: 'king' or 'queen' (kingside or queenside castling)
-    - castling_rights: Dict tracking if castling is still available
+    - castling_rights: Castling rights bits (WK, WQ, BK, BQ)
     
     Requirements for castling:
     1. King and rook haven't moved (tracked in castling_rights)
@@ -439,67 +926,23 @@ def can_castle(board, color, side, castling_rights):
     3. King is not in check
     4. King doesn't pass through check
     """
-    row = 7 if color == 'white' else 0
-    king_char = 'K' if color == 'white' else 'k'
-    
-    if side == 'king':
-        if not castling_rights[0]:  # Lost castling rights
-            return False
-        if board[row][4] != king_char:  # King not in correct position
-            return False
-        if board[row][5] != '.' or board[row][6] != '.':  # Path not clear
-            return False
-        if not (board[row][7] in ('R','r') and get_piece_color(board[row][7]) == color):
-            return False
-        opponent = 'black' if color == 'white' else 'white'
-        # Check if king is in check or passes through check
-        if in_check(board, color):
-            return False
-        if square_attacked_by(board, row, 5, opponent):
-            return False
-        if square_attacked_by(board, row, 6, opponent):
-            return False
-        return True
-    else:  # queen-side
-        if not castling_rights[1]:  # Lost castling rights
-            return False
-        if board[row][4] != king_char:  # King not in correct position
-            return False
-        if board[row][3] != '.' or board[row][2] != '.' or board[row][1] != '.':  # Path not clear
-            return False
-        if not (board[row][0] in ('R','r') and get_piece_color(board[row][0]) == color):
-            return False
-        opponent = 'black' if color == 'white' else 'white'
-        # Check if king is in check or passes through check
-        if in_check(board, color):
-            return False
-        if square_attacked_by(board, row, 3, opponent):
-            return False
-        if square_attacked_by(board, row, 2, opponent):
-            return False
-        return True
+    key = (color, side)
+    if not castling_rights & CASTLE_RIGHT[key]:  # Lost castling rights
+        return False
+    if board.occ & CASTLE_BETWEEN[key]:  # Path not clear
+        return False
 
-def do_castle(board, color, side):
-    """
-    Execute a castling move by moving both king and rook.
-    Assumes the move has already been validated.
-    """
-    row = 7 if color == 'white' else 0
-    king_char = 'K' if color == 'white' else 'k'
-    if side == 'king':
-        # Move king from e1 to g1 (or e8 to g8)
-        board[row][4] = '.'
-        board[row][6] = king_char
-        # Move rook from h1 to f1 (or h8 to f8)
-        board[row][5] = board[row][7]
-        board[row][7] = '.'
+    if color == 'white':
+        king, rook, opponent = board.wk >> 60, board.wr, 'black'  # e1
     else:
-        # Move king from e1 to c1 (or e8 to c8)
-        board[row][4] = '.'
-        board[row][2] = king_char
-        # Move rook from a1 to d1 (or a8 to d8)
-        board[row][3] = board[row][0]
-        board[row][0] = '.'
+        king, rook, opponent = board.bk >> 4, board.br, 'white'   # e8
+    if not king & 1:  # King not in correct position
+        return False
+    if not rook >> CASTLE_ROOK[key] & 1:
+        return False
+
+    # King may not be in check or pass through check
+    return not attacks_by(board, opponent) & CASTLE_KING_PATH[key]
 
 def promotion_choice(color):
     """
@@ -516,74 +959,113 @@ def promotion_choice(color):
 # Move execution
 ########################################
 
-def move_with_extras(board, start, end, turn_white, en_passant_target, castling_dict):
+def xor_piece(board, piece, mask):
+    """Toggle the squares in mask on piece's bitboard and its side's occupancy."""
+    attr = PIECE_FIELDS[piece]
+    bb = getattr(board, attr) ^ mask
+    setattr(board, attr, bb)
+    keys = ZOBRIST_PIECES[piece]
+    code = PIECE_INDEX[piece]
+    for sq in iter_bits(mask):
+        board.key ^= keys[sq]
+        board.squares[sq] = code if bb >> sq & 1 else 0
+    if code & BLACK:
+        board.occ_b ^= mask
+    else:
+        board.occ_w ^= mask
+    board.occ = board.occ_w | board.occ_b
+
+def make_move(board, move, promotion=None):
     """
-    Execute a move and handle special cases (castling, en passant, promotion).
-    Updates the board in place and returns (new_en_passant_target, updated_castling_rights).
-    
-    This function assumes the move has already been validated as legal.
+    Apply an already validated move to board in place.
+    Handles captures, en passant and the castling rook. A pawn reaching the
+    last rank becomes 'promotion', or stays a pawn if promotion is None
+    (enough for king-safety probes).
+
+    Every change is an XOR of one piece bitboard, so the returned undo
+    record is just the list of (piece, mask) pairs applied; unmake_move
+    XORs them again, in reverse order so the mailbox is restored too.
+    """
+    frm = move & 63
+    to = (move >> 6) & 63
+    from_bit = 1 << frm
+    to_bit = 1 << to
+    code = board.squares[frm]
+    kind = code & 7
+    piece = PIECE_CODES[code]
+    undo = []
+
+    captured = piece_at(board, to)
+    if captured != '.':
+        undo.append((captured, to_bit))
+    elif kind == PAWN and (frm ^ to) & 7:
+        # Diagonal pawn move onto an empty square is en passant;
+        # the captured pawn sits beside the mover, on the target's file
+        ep_sq = (frm & ~7) | (to & 7)
+        undo.append((piece_at(board, ep_sq), 1 << ep_sq))
+
+    if kind == PAWN and promotion and to >> 3 in (0, 7):
+        undo.append((piece, from_bit))
+        undo.append((promotion, to_bit))
+    else:
+        undo.append((piece, from_bit | to_bit))
+
+    # Castling also moves the rook
+    if kind == KING and abs((to & 7) - (frm & 7)) == 2:
+        rook = 'r' if code & BLACK else 'R'
+        home = frm & ~7
+        rook_from, rook_to = (home + 7, home + 5) if to & 7 == 6 else (home, home + 3)
+        undo.append((rook, (1 << rook_from) | (1 << rook_to)))
+
+    for moved, mask in undo:
+        xor_piece(board, moved, mask)
+    return undo
+
+def unmake_move(board, undo):
+    """Take back a move applied by make_move."""
+    for piece, mask in reversed(undo):
+        xor_piece(board, piece, mask)
+
+def finalize_move(board, move, castling_rights):
     """
-    r1, c1 = start
-    r2, c2 = end
-    piece = board[r1][c1]
-    p = piece.upper()
-    color = 'white' if is_white(piece) else 'black'
-    row = 7 if color == 'white' else 0
+    Finish a legal move that make_move has already applied to the board:
+    prompt for the promotion piece if a pawn reached the last rank, and
+    work out the new en passant target and castling rights.
+    Returns (new_en_passant_target, updated_castling_rights).
+
+    Kept separate from make_move so the promotion prompt only happens
+    once a move is known to be legal.
+    """
+    frm = move & 63
+    to = (move >> 6) & 63
+    code = board.squares[to]
+    side = code >> 3
 
     new_enp = None
 
-    # Handle castling
-    if p == 'K' and (r1, c1) == (row, 4):
-        if (r2, c2) == (row, 6) and can_castle(board, color, 'king', castling_dict[color]):
-            do_castle(board, color, 'king')
-            castling_dict[color] = [False, False]
-            return None, castling_dict
-        if (r2, c2) == (row, 2) and can_castle(board, color, 'queen', castling_dict[color]):
-            do_castle(board, color, 'queen')
-            castling_dict[color] = [False, False]
-            return None, castling_dict
-
-    # Regular move
-    board[r1][c1] = '.'
-    
-    # Handle en passant capture
-    if p == 'P' and en_passant_target is not None:
-        ep_r, ep_c = en_passant_target
-        if (r2, c2) == (ep_r, ep_c) and c1 != c2 and board[r2][c2] == '.':
-            board[r1][c2] = '.'  # remove captured pawn
-
-    board[r2][c2] = piece
-
-    # Set up new en passant target if pawn moves two squares
-    if p == 'P':
-        direction = -1 if color=='white' else 1
-        if abs(r2 - r1) == 2:
-            mid_r = (r1 + r2) // 2
-            new_enp = (mid_r, c1)
-
-    # Handle pawn promotion
-    if p == 'P':
-        if color == 'white' and r2 == 0:
-            board[r2][c2] = promotion_choice(color)
-        elif color == 'black' and r2 == 7:
-            board[r2][c2] = promotion_choice(color)
-
-    # Update castling rights if king or rook moves
-    if p == 'K':
-        castling_dict[color] = [False, False]
-    elif p == 'R':
-        if color=='white':
-            if (r1, c1) == (7, 0):
-                castling_dict[color][1] = False  # Lost queenside
-            if (r1, c1) == (7, 7):
-                castling_dict[color][0] = False  # Lost kingside
-        else:
-            if (r1, c1) == (0, 0):
-                castling_dict[color][1] = False  # Lost queenside
-            if (r1, c1) == (0, 7):
-                castling_dict[color][0] = False  # Lost kingside
+    if code & 7 == PAWN:
+        # Set up new en passant target if pawn moves two squares
+        if abs(to - frm) == 16:
+            new_enp = (frm + to) // 2
+        # Handle pawn promotion
+        elif to >> 3 == PROMO_ROW[side]:
+            put_piece(board, to, promotion_choice(COLORS[side]))
+
+    # Update castling rights if a king or rook leaves, or a rook is
+    # captured on, its home square
+    castling_rights &= ~(CASTLE_LOSS[frm] | CASTLE_LOSS[to])
+
+    return new_enp, castling_rights
 
-    return new_enp, castling_dict
+def move_with_extras(board, move, castling_rights):
+    """
+    Execute a move and handle special cases (castling, en passant, promotion).
+    Updates the board in place and returns (new_en_passant_target, updated_castling_rights).
+    
+    This function assumes the move has already been validated as legal.
+    """
+    make_move(board, move)
+    return finalize_move(board, move, castling_rights)
 
 ########################################
 # Checkmate detection
@@ -621,44 +1103,105 @@ def is_stalemate(board, color, castling_rights, en_passant_target):
 # Helper: has_legal_move
 ########################################
 
+# Legal move lists from generate_legal_moves, keyed by position_key and
+# shared with has_legal_move. Positions reached again through another move
+# order reuse the list.
+LEGAL_MOVE_CACHE = {}
+
+# Attack function for each piece type (code & 7, see PIECE_CODES), all
+# taking (sq, occ). Pawns are None: their moves depend on side and en
+# passant and are handled in pseudo_moves.
+PIECE_ATTACKS = (
+    None, None, knight_attacks, bishop_attacks,
+    rook_attacks, queen_attacks, king_attacks,
+)
+
+def pseudo_moves(sq, code, occ, own_occ, en_passant_target):
+    """
+    Bitboard of the squares the piece with code 'code' (see PIECE_CODES)
+    on sq can move to, ignoring whether its own king is left in check.
+    Castling is not included; see can_castle.
+    """
+    attacks = PIECE_ATTACKS[code & 7]
+    if attacks is not None:
+        return attacks(sq, occ) & ~own_occ
+    side = code >> 3
+    empty = ~occ
+    enemy = occ & ~own_occ
+    if en_passant_target is not None:
+        enemy |= 1 << en_passant_target
+    push = PAWN_PUSH[side][sq]
+    double = 0 if push & occ else PAWN_DOUBLE[side][sq]
+    return ((push | double) & empty) | (PAWN_ATTACKS[side][sq] & enemy)
+
+def iter_legal_moves(board, color, castling_rights, en_passant_target):
+    """
+    Yield every legal move (see mk_move) for the given color.
+    Destinations come from pseudo_moves and are filtered with the pin and
+    check information from compute_king_info. Only king moves and en
+    passant captures, whose safety that information cannot settle, are
+    played out and tested with in_check; the board is restored before
+    each such move is yielded.
+    """
+    occ = board.occ
+    if color == 'white':
+        own, king = board.occ_w, board.wk
+    else:
+        own, king = board.occ_b, board.bk
+    ep_bit = 0 if en_passant_target is None else 1 << en_passant_target
+    squares = board.squares
+    checkers, pinned, pin_rays, block_mask = compute_king_info(board, color)
+    for sq in iter_bits(own):
+        code = squares[sq]
+        dests = pseudo_moves(sq, code, occ, own, en_passant_target)
+        if king >> sq & 1:
+            probe, dests = dests, 0
+        elif code & 7 == PAWN:
+            probe = dests & ep_bit
+            dests &= ~ep_bit
+        else:
+            probe = 0
+        dests &= block_mask
+        if pinned >> sq & 1:
+            dests &= pin_rays[sq]
+        for to in iter_bits(dests):
+            yield mk_move(sq, to)
+        for to in iter_bits(probe):
+            move = mk_move(sq, to)
+            undo = make_move(board, move)
+            safe = not in_check(board, color)
+            unmake_move(board, undo)
+            if safe:
+                yield move
+
+    # Castling: the king steps two squares towards the rook
+    for side, step in (('king', 2), ('queen', -2)):
+        if can_castle(board, color, side, castling_rights):
+            king_sq = find_king_position(board, color)
+            yield mk_move(king_sq, king_sq + step)
+
+def generate_legal_moves(board, color, castling_rights, en_passant_target):
+    """
+    Return a tuple of every legal move (see mk_move) for the given color.
+    Results are cached by Zobrist key; the cache is emptied when it fills.
+    """
+    key = position_key(board, color, castling_rights, en_passant_target)
+    return cached_call(
+        LEGAL_MOVE_CACHE, key, _generate_legal_moves,
+        board, color, castling_rights, en_passant_target,
+    )
+
+def _generate_legal_moves(board, color, castling_rights, en_passant_target):
+    """Uncached body of generate_legal_moves."""
+    return tuple(iter_legal_moves(board, color, castling_rights, en_passant_target))
+
 def has_legal_move(board, color, castling_rights, en_passant_target):
     """
     Check if the given color has at least one legal move available.
     Used by both checkmate and stalemate detection.
-    
-    Approach:
-    1. Try every piece of the given color
-    2. Try every possible destination square
-    3. If any move is legal and doesn't leave king in check, return True
-    4. If no legal moves found, return False
+    Shares generate_legal_moves' cached move list for the position.
     """
-    for r in range(8):
-        for c in range(8):
-            piece = board[r][c]
-            if piece != '.' and get_piece_color(piece) == color:
-                for rr in range(8):
-                    for cc in range(8):
-                        if is_valid_move(
-                            board, (r, c), (rr, cc),
-                            color == "white",
-                            en_passant_target,
-                            castling_rights,
-                            checking_check=True
-                        ):
-                            # Try the move and check if it leaves king in check
-                            temp_board = copy_board(board)
-                            temp_cr = {
-                                "white": castling_rights["white"][:],
-                                "black": castling_rights["black"][:]
-                            }
-                            _temp_enp, temp_cr = move_with_extras(
-                                temp_board, (r, c), (rr, cc),
-                                color == "white",
-                                en_passant_target, temp_cr
-                            )
-                            if not in_check(temp_board, color):
-                                return True
-    return False
+    return bool(generate_legal_moves(board, color, castling_rights, en_passant_target))
 
 ########################################
 # Main game loop
@@ -676,65 +1219,52 @@ def main():
     board = copy_board(STARTING_BOARD)
     turn_white = True
     en_passant_target = None
-    castling_rights = {
-        "white": CASTLE_RIGHTS["white"][:],
-        "black": CASTLE_RIGHTS["black"][:]
-    }
+    castling_rights = CASTLE_RIGHTS
 
     while True:
         print_board(board)
         player_color = 'white' if turn_white else 'black'
         player_str = 'White' if turn_white else 'Black'
 
-        # Check game-ending conditions
-        if is_checkmate(board, player_color, castling_rights, en_passant_target):
-            winner = 'Black' if turn_white else 'White'
-            print(f"Checkmate! {winner} wins!")
-            sys.exit()
-
-        if is_stalemate(board, player_color, castling_rights, en_passant_target):
-            print("Stalemate! It's a draw.")
+        # Check game-ending conditions. Checkmate and stalemate are the
+        # two outcomes of the same pair of questions, so ask each once.
+        checked = in_check(board, player_color)
+        if not has_legal_move(board, player_color, castling_rights, en_passant_target):
+            if checked:
+                winner = 'Black' if turn_white else 'White'
+                print(f"Checkmate! {winner} wins!")
+            else:
+                print("Stalemate! It's a draw.")
             sys.exit()
 
         # Warn if in check
-        if in_check(board, player_color):
+        if checked:
             print(f"{player_str} is in check!")
 
         # Get and validate move
-        move_input = input(f"{player_str}'s move (e.g. 'e2 e4', or 'quit'): ")
-        if move_input.lower() == 'quit':
+        print(f"{player_str}'s move (e.g. 'e2 e4', or 'quit'): ", end="", flush=True)
+        move_input = sys.stdin.readline()
+        if not move_input or move_input.strip().lower() == 'quit':
+            # Treat end of input like 'quit'
             print("Goodbye.")
             sys.exit()
 
-        start, end = parse_move(move_input)
-        if start is None or end is None:
+        move = parse_move(move_input)
+        if move is None:
             print("Invalid format. Try 'e2 e4'.")
             continue
 
-        # Validate move
-        if is_valid_move(board, start, end, turn_white, en_passant_target, castling_rights):
-            # Double-check it doesn't leave king in check
-            temp_board = copy_board(board)
-            temp_cr = {
-                "white": castling_rights["white"][:],
-                "black": castling_rights["black"][:]
-            }
-            _temp_enp, temp_cr = move_with_extras(
-                temp_board, start, end, turn_white,
-                en_passant_target, temp_cr
-            )
-            if in_check(temp_board, player_color):
-                print("Illegal: king would remain in check.")
-                continue
-
-            # Execute move
-            en_passant_target, castling_rights = move_with_extras(
-                board, start, end, turn_white,
-                en_passant_target, castling_rights
-            )
-            turn_white = not turn_white
-        else:
+        # Validate move; the piece-movement check comes first so the two
+        # kinds of illegal move get different messages
+        if not is_pseudo_legal(board, move, turn_white, en_passant_target, castling_rights):
             print("Illegal move. Try again.")
+            continue
+        if not keeps_king_safe(board, move, turn_white, en_passant_target):
+            print("Illegal: king would remain in check.")
+            continue
+
+        en_passant_target, castling_rights = move_with_extras(board, move, castling_rights)
+        turn_white = not turn_white
 
 if __name__ == "__main__":
     main()
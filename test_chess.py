@@ -0,0 +1,109 @@
+"""
+Move generation tests for Chess.py.
+
+Perft (node counts of the legal move tree) against the published counts
+for the standard test positions, and a check that is_valid_move agrees
+with iter_legal_moves on every from/to pair.
+
+Run with:
+    $ python -m unittest test_chess
+"""
+
+import unittest
+
+import Chess
+
+# Standard perft positions: FEN placement, side, castling, then the
+# expected node count for each depth tested
+POSITIONS = {
+    'start': ('rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq',
+              {3: 8902, 4: 197281}),
+    'kiwipete': ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq',
+                 {3: 97862}),
+    'position3': ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w -',
+                  {4: 43238}),
+    'position4': ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq',
+                  {3: 9467}),
+    'position5': ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ',
+                  {3: 62379}),
+}
+
+CASTLE_CHARS = {'K': Chess.WK, 'Q': Chess.WQ, 'k': Chess.BK, 'q': Chess.BQ}
+
+def load(fen):
+    """Return (board, turn_white, castling_rights) for a FEN prefix."""
+    placement, side, castling = fen.split()
+    rows = []
+    for rank in placement.split('/'):
+        row = ''
+        for ch in rank:
+            row += '.' * int(ch) if ch.isdigit() else ch
+        rows.append(row)
+    rights = 0
+    for ch in castling.strip('-'):
+        rights |= CASTLE_CHARS[ch]
+    return Chess.board_from_rows(rows), side == 'w', rights
+
+def is_promotion(board, move):
+    """True if move takes a pawn to the last rank."""
+    code = board.squares[move & 63]
+    return code & 7 == Chess.PAWN and (move >> 9) & 7 in (0, 7)
+
+def perft(board, turn_white, castling_rights, ep, depth):
+    """Count leaf nodes of the legal move tree, one per promotion piece."""
+    color = 'white' if turn_white else 'black'
+    moves = Chess.generate_legal_moves(board, color, castling_rights, ep)
+    if depth == 1:
+        return sum(4 if is_promotion(board, m) else 1 for m in moves)
+    nodes = 0
+    for move in moves:
+        pieces = 'QRBN' if is_promotion(board, move) else (None,)
+        for piece in pieces:
+            if piece is not None and not turn_white:
+                piece = piece.lower()
+            undo = Chess.make_move(board, move, piece)
+            new_ep, new_rights = Chess.finalize_move(board, move, castling_rights)
+            nodes += perft(board, not turn_white, new_rights, new_ep, depth - 1)
+            Chess.unmake_move(board, undo)
+    return nodes
+
+class PerftTest(unittest.TestCase):
+
+    def test_perft(self):
+        for name, (fen, counts) in POSITIONS.items():
+            board, turn_white, rights = load(fen)
+            for depth, expected in counts.items():
+                with self.subTest(position=name, depth=depth):
+                    self.assertEqual(perft(board, turn_white, rights, None, depth), expected)
+
+class IsValidMoveTest(unittest.TestCase):
+
+    def check_agrees(self, board, turn_white, rights, ep):
+        color = 'white' if turn_white else 'black'
+        legal = set(Chess.iter_legal_moves(board, color, rights, ep))
+        for frm in range(64):
+            for to in range(64):
+                move = Chess.mk_move(frm, to)
+                self.assertEqual(
+                    Chess.is_valid_move(board, move, turn_white, ep, rights),
+                    move in legal,
+                    (Chess.board_to_rows(board), frm, to),
+                )
+
+    def test_agrees_with_iter_legal_moves(self):
+        # Each test position and every position one move from it
+        for fen, _ in POSITIONS.values():
+            board, turn_white, rights = load(fen)
+            self.check_agrees(board, turn_white, rights, None)
+            color = 'white' if turn_white else 'black'
+            for move in Chess.generate_legal_moves(board, color, rights, None):
+                piece = None
+                if is_promotion(board, move):
+                    piece = 'Q' if turn_white else 'q'
+                undo = Chess.make_move(board, move, piece)
+                ep, new_rights = Chess.finalize_move(board, move, rights)
+                self.check_agrees(board, not turn_white, new_rights, ep)
+                Chess.unmake_move(board, undo)
+
+if __name__ == '__main__':
+    unittest.main()